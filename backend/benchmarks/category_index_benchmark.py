@@ -0,0 +1,133 @@
+'''
+Shows the query plans and latency of the category queries before and after
+the migration of questions.category: a deep page of a category, as served by
+GET /categories/<id>/questions, and the ids of a category, as read for the
+quiz question pools. Before, the category is a VARCHAR column without an
+index, compared to the integer id through a cast. After, it is the indexed
+integer column of the current schema. The queries are the ones the app
+builds, compiled for the database being measured.
+
+    python benchmarks/category_index_benchmark.py --size 100000
+
+The questions are seeded into a fresh SQLite database unless --database-url
+points at an empty scratch database, e.g. a Postgres one, whose tables are
+dropped afterwards. Results are printed as JSON.
+'''
+import argparse
+import json
+import random
+import tempfile
+
+from sqlalchemy import Column, Integer, MetaData, String, Table, cast, select, text
+from sqlalchemy.sql.visitors import replacement_traverse
+
+from common import database_url, drop, median_ms, seed
+
+from flaskr import QUESTIONS_PER_PAGE, create_app, question_page_query
+from flaskr.quiz import question_pool_query
+from models import db, Question
+
+# The page of a category this deep into it, read with an offset
+PAGE_OFFSET = 3000
+
+QUESTIONS = Question.__table__
+# The questions table as it was before the migration: the same rows, with the
+# category stored as a string and no index on it
+LEGACY_QUESTIONS = Table('questions_varchar', MetaData(), *[
+    Column(column.name, String if column.name == 'category' else column.type,
+           primary_key=column.primary_key)
+    for column in QUESTIONS.columns])
+
+
+def build_queries(category_id, after_id):
+    # The queries the app runs, so the plans are the ones it gets
+    return {
+        'category_page': question_page_query(
+            page=PAGE_OFFSET // QUESTIONS_PER_PAGE + 1, category_id=category_id).statement,
+        'category_after_id': question_page_query(category_id=category_id, after_id=after_id).statement,
+        'quiz_pool': question_pool_query(category_id).statement,
+    }
+
+
+def to_legacy(statement):
+    '''
+    Rewrites a query of the app to read the legacy table, comparing its string
+    category to the integer ids through a cast
+    '''
+    def replace(element):
+        # ORM queries hold annotated copies of the table and its columns
+        base = element._deannotate() if hasattr(element, '_deannotate') else element
+        if base is QUESTIONS:
+            return LEGACY_QUESTIONS
+        if isinstance(base, Column) and base.table is QUESTIONS:
+            column = LEGACY_QUESTIONS.c[base.key]
+            return cast(column, Integer) if base.key == 'category' else column
+
+    return replacement_traverse(statement, {}, replace)
+
+
+def create_legacy_questions():
+    LEGACY_QUESTIONS.create(db.session.connection())
+    db.session.execute(LEGACY_QUESTIONS.insert().from_select(
+        [column.name for column in QUESTIONS.columns],
+        select(*[cast(column, String) if column.name == 'category' else column for column in QUESTIONS.columns])))
+
+
+def explain(statement):
+    sql = statement.compile(
+        db.engine, compile_kwargs={'literal_binds': True})
+    if db.engine.dialect.name == 'postgresql':
+        explained = f'EXPLAIN (ANALYZE, COSTS OFF) {sql}'
+    else:
+        explained = f'EXPLAIN QUERY PLAN {sql}'
+
+    # The plan is the last column of each row, on both SQLite and Postgres
+    return [row[-1] for row in db.session.execute(text(explained))]
+
+
+def measure(repeat, queries):
+    return {name: {
+        'plan': explain(statement),
+        'median_ms': median_ms(lambda: db.session.execute(statement).fetchall(), repeat)
+    } for name, statement in queries.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=100000)
+    parser.add_argument('--database-url')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1914)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'DATABASE_PATH': database_url(
+            args.database_url, directory), 'SCHEMA_MODE': 'create'})
+
+        with app.app_context():
+            seed(args.size, random.Random(args.seed))
+            queries = build_queries(3, args.size // 2)
+
+            create_legacy_questions()
+            db.session.execute(text('ANALYZE'))
+            before = measure(args.repeat, {
+                name: to_legacy(statement) for name, statement in queries.items()})
+            after = measure(args.repeat, queries)
+
+            LEGACY_QUESTIONS.drop(db.session.connection())
+            db.session.commit()
+
+            result = {
+                'size': args.size,
+                'dialect': db.engine.dialect.name,
+                'before': before,
+                'after': after
+            }
+
+        drop(app)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
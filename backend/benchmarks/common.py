@@ -0,0 +1,76 @@
+'''
+Helpers shared by the benchmark scripts: synthetic data and timing.
+'''
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import db, Question, Category, User  # noqa: E402
+
+CATEGORY_COUNT = 6
+WORDS = [f'{syllable}{suffix}' for syllable in ('ka', 'lo', 'mi', 'ne', 'ru', 'so', 'ti', 'va')
+         for suffix in range(250)]
+
+
+def database_url(database_url, directory):
+    # A fresh SQLite database in the directory, unless a scratch database is given
+    return database_url or f'sqlite:///{os.path.join(directory, "trivia.db")}'
+
+
+def seed(size, rng, chunk_size=10000):
+    '''
+    Inserts the categories and `size` random questions
+    '''
+    db.session.execute(Category.__table__.insert(), [
+        {'type': f'Category {id}'} for id in range(1, CATEGORY_COUNT + 1)])
+
+    for start in range(0, size, chunk_size):
+        db.session.execute(Question.__table__.insert(), [{
+            'question': f"{' '.join(rng.choice(WORDS) for word in range(8))} {row}?",
+            'answer': rng.choice(WORDS),
+            'category': rng.randint(1, CATEGORY_COUNT),
+            'difficulty': rng.randint(1, 5),
+            'rating': 3
+        } for row in range(start, min(start + chunk_size, size))])
+
+    db.session.commit()
+
+
+def seed_users(count, rng):
+    '''
+    Inserts `count` users with random scores
+    '''
+    db.session.execute(User.__table__.insert(), [
+        {'username': f'player{id}', 'score': rng.randint(0, 1000)} for id in range(count)])
+    db.session.commit()
+
+
+def drop(app):
+    with app.app_context():
+        db.session.remove()
+        db.drop_all()
+        db.engine.dispose()
+
+
+def median_ms(run, repeat):
+    timings = []
+    for attempt in range(repeat):
+        started = time.perf_counter()
+        run()
+        timings.append((time.perf_counter() - started) * 1000)
+
+    return statistics.median(timings)
+
+
+def percentiles(timings):
+    '''
+    Returns the median, 95th and 99th percentiles of the timings
+    '''
+    if len(timings) < 2:
+        return {'p50_ms': timings[0], 'p95_ms': timings[0], 'p99_ms': timings[0]} if timings else {}
+
+    cuts = statistics.quantiles(timings, n=100, method='inclusive')
+    return {'p50_ms': cuts[49], 'p95_ms': cuts[94], 'p99_ms': cuts[98]}
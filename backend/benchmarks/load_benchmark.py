@@ -0,0 +1,211 @@
+'''
+Measures the latency of the main endpoints as the question bank grows, both
+one request at a time through the Flask test client and under concurrent
+load through a threaded HTTP server.
+
+    python benchmarks/load_benchmark.py --sizes 1000 10000 100000 1000000
+
+For each size and endpoint it reports the p50, p95 and p99 latency, the
+number of SQL queries per request and, under load, the throughput and the
+failed requests. Each size is seeded into a fresh SQLite database unless
+--database-url points at an empty scratch database, e.g. an ephemeral
+Postgres one, whose tables are dropped afterwards. Results are printed as
+JSON, or written to --output, so runs can be compared to catch regressions.
+'''
+import argparse
+import http.client
+import json
+import logging
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from werkzeug.serving import make_server
+
+from common import CATEGORY_COUNT, WORDS, database_url, drop, percentiles, seed, seed_users
+
+from flaskr import create_app
+from models import db
+
+BASE_URL = '/api/v0.1.0'
+USER_COUNT = 1000
+MODES = ('client', 'http')
+
+
+def build_requests(name, count, size, rng):
+    '''
+    Returns `count` (method, path, body) requests of the endpoint, drawn with
+    `rng` so every run sends the same requests
+    '''
+    pages = max(size // 3, 1)
+    requests = []
+
+    for position in range(count):
+        if name == 'questions':
+            request = ('GET', f'{BASE_URL}/questions?page={rng.randint(1, min(pages, 100))}', None)
+        elif name == 'categories_quiz':
+            request = ('GET', f'{BASE_URL}/categories?quiz=true', None)
+        elif name in ('search', 'search_fulltext'):
+            request = ('POST', f'{BASE_URL}/questions', {
+                'search_term': rng.choice(WORDS),
+                'search_mode': 'fulltext' if name == 'search_fulltext' else 'substring'
+            })
+        elif name == 'quiz':
+            request = ('POST', f'{BASE_URL}/quizzes', {
+                'quiz_category': {'id': rng.randint(0, CATEGORY_COUNT)},
+                'previous_questions': rng.sample(range(1, size + 1), min(size, 10))
+            })
+        elif name == 'users':
+            request = ('GET', f'{BASE_URL}/users', None)
+        elif name == 'leaderboard':
+            request = ('GET', f'{BASE_URL}/leaderboard', None)
+        requests.append(request)
+
+    return requests
+
+
+ENDPOINTS = ('questions', 'categories_quiz', 'search',
+             'search_fulltext', 'quiz', 'users', 'leaderboard')
+
+
+class QueryCounter:
+    '''
+    Counts the SQL statements run by the engine while it is installed
+    '''
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self.increment)
+        return self
+
+    def __exit__(self, *exc_info):
+        event.remove(self.engine, 'before_cursor_execute', self.increment)
+
+    def increment(self, *args):
+        # Only ever read after the load is over, so a lost increment under
+        # concurrency would at worst make the count slightly low
+        self.count += 1
+
+
+def run_client(app, requests):
+    client = app.test_client()
+    timings = []
+    errors = 0
+
+    with QueryCounter(db.engine) as queries:
+        for method, path, body in requests:
+            started = time.perf_counter()
+            res = client.open(path, method=method, json=body)
+            timings.append((time.perf_counter() - started) * 1000)
+            errors += res.status_code >= 500
+
+    return dict(percentiles(timings), requests=len(requests), errors=errors,
+                queries_per_request=queries.count / len(requests))
+
+
+def send(port, method, path, body):
+    connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+    try:
+        headers = {'Content-Type': 'application/json'} if body is not None else {}
+        connection.request(method, path, json.dumps(
+            body) if body is not None else None, headers)
+        response = connection.getresponse()
+        response.read()
+        return response.status
+    finally:
+        connection.close()
+
+
+def run_http(app, requests, concurrency):
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    def timed(request):
+        started = time.perf_counter()
+        try:
+            status = send(server.server_port, *request)
+        except (OSError, http.client.HTTPException):
+            status = None
+        return (time.perf_counter() - started) * 1000, status
+
+    try:
+        with QueryCounter(db.engine) as queries, ThreadPoolExecutor(concurrency) as executor:
+            started = time.perf_counter()
+            results = list(executor.map(timed, requests))
+            seconds = time.perf_counter() - started
+    finally:
+        server.shutdown()
+        thread.join()
+
+    timings = [timing for timing, status in results]
+    errors = sum(1 for timing, status in results if status is None or status >= 500)
+
+    return dict(percentiles(timings), requests=len(requests), errors=errors, concurrency=concurrency,
+                requests_per_second=round(len(requests) / seconds, 1),
+                queries_per_request=queries.count / len(requests))
+
+
+def run(size, args, rng):
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'DATABASE_PATH': database_url(
+            args.database_url, directory), 'SCHEMA_MODE': 'create'})
+
+        with app.app_context():
+            seed(size, rng)
+            seed_users(USER_COUNT, rng)
+            result = {'size': size, 'dialect': db.engine.dialect.name}
+
+            for mode in args.modes:
+                result[mode] = {}
+                for name in args.endpoints:
+                    requests = build_requests(name, args.requests, size, rng)
+                    # The first requests fill the caches and the in-memory
+                    # indexes, which is measured by the startup, not here
+                    run_client(app, requests[:args.warmup])
+                    if mode == 'client':
+                        result[mode][name] = run_client(app, requests)
+                    else:
+                        result[mode][name] = run_http(
+                            app, requests, args.concurrency)
+
+        drop(app)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000])
+    parser.add_argument('--database-url')
+    parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--requests', type=int, default=200,
+                        help='Requests sent to each endpoint in each mode.')
+    parser.add_argument('--warmup', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seed', type=int, default=1914)
+    parser.add_argument('--output', help='Write the results to this file.')
+    args = parser.parse_args()
+
+    # The server would otherwise log every request
+    logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    rng = random.Random(args.seed)
+    results = json.dumps([run(size, args, rng)
+                         for size in args.sizes], indent=2)
+
+    if args.output:
+        with open(args.output, 'w') as output:
+            output.write(results)
+    else:
+        print(results)
+
+
+if __name__ == '__main__':
+    main()
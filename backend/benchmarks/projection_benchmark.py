@@ -0,0 +1,83 @@
+'''
+Compares reading a listing of questions as full Question objects formatted
+with `format()` against reading only its columns as plain rows formatted
+with `Question.format_row()`, as the listing endpoints do: the latency and
+the memory allocated while building the formatted questions.
+
+    python benchmarks/projection_benchmark.py --size 10000
+
+The questions are seeded into a fresh SQLite database unless --database-url
+points at an empty scratch database, e.g. a Postgres one, whose tables are
+dropped afterwards. Results are printed as JSON.
+'''
+import argparse
+import json
+import random
+import tempfile
+import tracemalloc
+
+from common import database_url, drop, median_ms, seed
+
+from flaskr import create_app
+from models import db, Question, QUESTION_COLUMNS
+
+
+def read_objects():
+    return [question.format() for question in Question.query.order_by(Question.id)]
+
+
+def read_rows():
+    return [Question.format_row(row) for row in db.session.query(*QUESTION_COLUMNS).order_by(Question.id)]
+
+
+def measure(read, repeat):
+    def run():
+        read()
+        # Objects would otherwise be found in the identity map next time
+        db.session.remove()
+
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    return {
+        'median_ms': median_ms(run, repeat),
+        'peak_kib': round(peak / 1024)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=10000)
+    parser.add_argument('--database-url')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=1914)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'DATABASE_PATH': database_url(
+            args.database_url, directory), 'SCHEMA_MODE': 'create'})
+
+        with app.app_context():
+            seed(args.size, random.Random(args.seed))
+            assert read_objects() == read_rows()
+
+            objects = measure(read_objects, args.repeat)
+            rows = measure(read_rows, args.repeat)
+            result = {
+                'size': args.size,
+                'dialect': db.engine.dialect.name,
+                'objects': objects,
+                'rows': rows,
+                'speedup': round(objects['median_ms'] / rows['median_ms'], 2),
+                'memory_ratio': round(objects['peak_kib'] / rows['peak_kib'], 2)
+            }
+
+        drop(app)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
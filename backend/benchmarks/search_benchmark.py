@@ -0,0 +1,85 @@
+'''
+Compares the latency of substring (ILIKE) and full-text question search as
+the questions table grows.
+
+    python benchmarks/search_benchmark.py --sizes 1000 10000 100000
+
+Each size is seeded into a fresh SQLite database unless --database-url
+points at an empty scratch database, e.g. a Postgres one to measure the GIN
+index. The tables are dropped from that database afterwards. Results are
+printed as JSON.
+'''
+import argparse
+import json
+import random
+import statistics
+import tempfile
+import time
+
+from common import WORDS, database_url, drop, seed
+
+from flaskr import create_app, search_index
+from models import db
+
+BASE_URL = '/api/v0.1.0'
+
+
+def measure(client, search_terms, search_mode):
+    timings = []
+    for search_term in search_terms:
+        started = time.perf_counter()
+        res = client.post(f'{BASE_URL}/questions', json={
+            "search_term": search_term,
+            "search_mode": search_mode
+        })
+        timings.append((time.perf_counter() - started) * 1000)
+        if res.status_code not in (200, 404):
+            raise RuntimeError(
+                f'{search_mode} search failed with {res.status_code}')
+
+    return statistics.median(timings)
+
+
+def run(size, url, repeat, rng):
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'DATABASE_PATH': database_url(
+            url, directory), 'SCHEMA_MODE': 'create'})
+        client = app.test_client()
+
+        with app.app_context():
+            seed(size, rng)
+            search_index.invalidate()
+            # Build the in-process index before timing, as a running server would have
+            client.post(f'{BASE_URL}/questions', json={
+                "search_term": WORDS[0], "search_mode": 'fulltext'})
+
+            terms = [rng.choice(WORDS) for term in range(repeat)]
+            result = {
+                'size': size,
+                'dialect': db.engine.dialect.name,
+                'substring_ms': measure(client, terms, 'substring'),
+                'fulltext_ms': measure(client, terms, 'fulltext')
+            }
+
+        drop(app)
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--sizes', type=int, nargs='+',
+                        default=[1000, 10000, 100000])
+    parser.add_argument('--database-url')
+    parser.add_argument('--repeat', type=int, default=50)
+    parser.add_argument('--seed', type=int, default=1914)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    results = [run(size, args.database_url, args.repeat, rng)
+               for size in args.sizes]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
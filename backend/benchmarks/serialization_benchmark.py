@@ -0,0 +1,100 @@
+'''
+Compares, for each listing endpoint, the size of the JSON responses and the
+time spent serializing them with Flask's pretty-printed sorted encoder, the
+compact standard encoder and orjson, along with the size of the compact
+body once compressed with gzip and brotli.
+
+    python benchmarks/serialization_benchmark.py --size 1000
+
+The questions are seeded into a fresh SQLite database unless --database-url
+points at an empty scratch database, e.g. a Postgres one, whose tables are
+dropped afterwards. Encoders and encodings whose package isn't installed are
+left out. Results are printed as JSON.
+'''
+import argparse
+import gzip
+import json
+import random
+import tempfile
+
+from flask.json.provider import DefaultJSONProvider
+
+from common import database_url, drop, median_ms, seed
+
+from flaskr import create_app
+from flaskr.compression import BROTLI_QUALITY, GZIP_LEVEL, brotli
+from flaskr.serialization import CompactJSONProvider, OrjsonProvider, orjson
+
+ENDPOINTS = (
+    '/api/v0.1.0/categories',
+    '/api/v0.1.0/categories?quiz=true',
+    '/api/v0.1.0/questions?page=2',
+    '/api/v0.1.0/categories/1/questions?page=2',
+    '/api/v0.1.0/leaderboard',
+)
+
+
+class PrettyJSONProvider(DefaultJSONProvider):
+    # What Flask sends in debug mode
+    compact = False
+    sort_keys = True
+
+
+def get_providers(app):
+    providers = {
+        'pretty': PrettyJSONProvider(app),
+        'compact': CompactJSONProvider(app)
+    }
+    if orjson is not None:
+        providers['orjson'] = OrjsonProvider(app)
+
+    return providers
+
+
+def measure(app, payload, repeat):
+    result = {}
+
+    for name, provider in get_providers(app).items():
+        body = provider.response(payload).get_data()
+        result[name] = {
+            'bytes': len(body),
+            'serialize_ms': median_ms(lambda: provider.response(payload), repeat)
+        }
+
+    body = CompactJSONProvider(app).response(payload).get_data()
+    result['gzip_bytes'] = len(gzip.compress(body, compresslevel=GZIP_LEVEL))
+    if brotli is not None:
+        result['br_bytes'] = len(brotli.compress(body, quality=BROTLI_QUALITY))
+
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--size', type=int, default=1000)
+    parser.add_argument('--database-url')
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--seed', type=int, default=1914)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        app = create_app({'DATABASE_PATH': database_url(
+            args.database_url, directory), 'SCHEMA_MODE': 'create'})
+        client = app.test_client()
+
+        with app.app_context():
+            seed(args.size, random.Random(args.seed))
+
+            result = {
+                'size': args.size,
+                'endpoints': {endpoint: measure(app, client.get(endpoint).get_json(), args.repeat)
+                              for endpoint in ENDPOINTS}
+            }
+
+        drop(app)
+
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,73 +1,476 @@
+import hashlib
+import io
+import json
 import os
-from flask import Flask, request, abort, jsonify
+import time
+import click
+from functools import wraps
+from flask import Flask, Response, request, abort, jsonify, g, stream_with_context
 from flask_sqlalchemy import SQLAlchemy
 from flask_cors import CORS
+from sqlalchemy import and_, event, func, or_, select
+from sqlalchemy.engine import Engine
 import random
 import math
-import random
-
-from models import setup_db, Question, Category, User
+from collections import namedtuple
+
+from models import SCHEMA_VERSION, setup_db, setup_schema, init_db, use_replica, reading_from_primary, database_path, db, get_data_version, get_pool_status, insert_unique, Question, Category, User, QUESTION_COLUMNS, USER_COLUMNS
+from settings import CATEGORY_CACHE_TTL, QUESTION_POOL_TTL, QUESTION_POOL_CHECK_INTERVAL, QUIZ_SESSION_TTL, SEARCH_MODE, SCORE_BUFFER_INTERVAL, LEADERBOARD_CACHE_TTL, SCHEMA_MODE, DATABASE_REPLICA_URLS, REPLICA_STICKY_SECONDS, HTTP_CACHE_MAX_AGE, RESPONSE_COMPRESSION, COMPRESSION_MIN_SIZE, JSON_PROVIDER, SQL_INSTRUMENTATION, METRICS_ENABLED
+from .cache import Cache
+from .compression import compress_response
+from .instrumentation import instrument
+from .metrics import CONTENT_TYPE as METRICS_CONTENT_TYPE, Metrics, render as render_metrics
+from .serialization import get_json_provider_class
+from .quiz import QuestionPools, QuizSessions
+from .scores import ScoreBuffer
+from .importer import IMPORT_CHUNK_SIZE, IMPORT_FORMATS, import_questions
+from .exporter import EXPORT_FORMATS, export_questions
+from .search import SEARCH_MODES, SearchIndex, fulltext_condition
 
 QUESTIONS_PER_PAGE = 3
+MAX_QUIZ_BATCH = 50
+LEADERBOARD_PER_PAGE = 10
+LEADERBOARD_SNAPSHOT_SIZE = 100
 BASE_URL = '/api/v0.1.0'
-error = 0
-question_count = 0
+# Set on clients that wrote to the database, holding the time until which
+# their reads are served by the primary
+READ_PRIMARY_COOKIE = 'read_primary_until'
+
+# A page of questions along with the total number of matches and the cursor
+# for the following page. It is returned per call, so concurrent requests
+# never share pagination state
+QuestionPage = namedtuple('QuestionPage', ['questions', 'total', 'next_cursor'])
+
+# Categories barely ever change, so both the full category map and the quiz
+# subset are cached. Every write that can change them invalidates the cache
+category_cache = Cache(ttl=CATEGORY_CACHE_TTL)
+
+# Question ids of each category are held in memory so quiz questions can be
+# drawn without asking the database which questions exist
+question_pools = QuestionPools(
+    ttl=QUESTION_POOL_TTL, check_interval=QUESTION_POOL_CHECK_INTERVAL)
+
+# Quizzes played through sessions are tracked by the server, so the client
+# doesn't send the questions it has already seen with every request
+quiz_sessions = QuizSessions(ttl=QUIZ_SESSION_TTL)
+
+# Full-text search uses a GIN index on Postgres. Other databases, such as
+# SQLite for local runs, fall back to this in-process index
+search_index = SearchIndex()
+
+# Most leaderboard requests are for the top players, which are kept in memory
+# for a few seconds
+leaderboard_cache = Cache(ttl=LEADERBOARD_CACHE_TTL)
+
+# When enabled, score increments of hot users are added up in memory and
+# written in batches instead of updating the row on every finished quiz
+score_buffer = ScoreBuffer(interval=SCORE_BUFFER_INTERVAL)
+
+# Request latencies and counters served by GET /metrics
+metrics = Metrics()
 
 
 def set_error_code(code):
-    global error
-    error = code
+    # Error codes are stored on the request context, so a code set by one
+    # request can't leak into another one served by a different thread
+    g.error = code
 
 
 def get_error_code():
-    global error
-    return error
+    return g.get('error', 500)
+
+
+def reads_pinned_to_primary():
+    return request.cookies.get(READ_PRIMARY_COOKIE, 0, type=float) > time.time()
+
+
+def mark_read_only():
+    # The queries of the request can be served by a read replica, unless the
+    # client wrote to the database in the last REPLICA_STICKY_SECONDS seconds
+    g.read_only = True
+    if not reads_pinned_to_primary():
+        use_replica()
+
+
+def loaded_for_cli_command():
+    # Commands such as `flask init-db` and `flask db upgrade` load the app
+    # while the flask group is being resolved, before the schema exists.
+    # `flask run` loads it from its own command, and servers without click
+    context = click.get_current_context(silent=True)
+    return context is not None and context.info_name != 'run'
+
+
+def read_only(handler):
+    '''
+    Marks a route that doesn't write to the database, so its queries can be
+    served by a read replica
+    '''
+    @wraps(handler)
+    def route(*args, **kwargs):
+        mark_read_only()
+
+        return handler(*args, **kwargs)
+
+    return route
+
+
+def writes_quiz_sessions(handler):
+    '''
+    Marks a route whose only writes are to quiz sessions. Sessions are always
+    read from the primary, so the client's other reads can keep going to the
+    replicas
+    '''
+    @wraps(handler)
+    def route(*args, **kwargs):
+        g.quiz_sessions_only = True
 
+        return handler(*args, **kwargs)
 
-def get_paginated_questions(page=1, q_per_page=QUESTIONS_PER_PAGE, search_term=None, category_id=None):
-    global question_count
+    return route
 
-    query = Question.query
+
+def listing_etag(data_version):
+    # A tag only matches the same listing: the path and query string, e.g. the
+    # page or cursor, and the schema the response was built from are part of it
+    key = f'{SCHEMA_VERSION}:{request.full_path}'
+    return f'v{data_version}-{hashlib.sha1(key.encode()).hexdigest()[:16]}'
+
+
+def conditional(handler):
+    '''
+    Tags the response of a route that only depends on the questions and
+    categories with the current data version. A client sending back that
+    tag in If-None-Match gets an empty 304 response, without the listing
+    being read or serialized. Tags are weak, since compressed and plain
+    bodies of the same listing share them
+    '''
+    @wraps(handler)
+    def route(*args, **kwargs):
+        g.etag = listing_etag(get_data_version())
+        if request.if_none_match.contains_weak(g.etag):
+            return Response(status=304)
+
+        return handler(*args, **kwargs)
+
+    return route
+
+
+def question_page_query(page=1, q_per_page=QUESTIONS_PER_PAGE, search_term=None, category_id=None, after_id=None):
+    conditions = []
 
     if search_term is not None:
-        query = query.filter(Question.question.ilike(f'%{search_term}%'))
-        if query.count() == 0:
-            return None
+        conditions.append(Question.question.ilike(f'%{search_term}%'))
 
     if category_id is not None and not category_id == 0:
-        query = query.filter(Question.category == category_id)
-        if query.count() == 0:
+        conditions.append(Question.category == category_id)
+
+    # The total is a scalar subquery over the same conditions, so the whole
+    # listing still costs a single statement, while the page itself is read
+    # straight from the table and only its rows are read in full
+    total = select(func.count()).select_from(Question).where(
+        *conditions).correlate(None).scalar_subquery().label('total')
+
+    # Only the columns of the response are read, as plain rows formatted
+    # straight into the questions of the page
+    query = db.session.query(*QUESTION_COLUMNS, total).filter(*conditions)
+
+    if after_id is not None:
+        # Keyset mode: seek past the cursor on the primary key instead of
+        # reading and discarding every row before the requested page
+        return query.filter(Question.id > after_id).order_by(Question.id).limit(q_per_page + 1)
+
+    return query.order_by(Question.id).offset((page-1)*q_per_page).limit(q_per_page + 1)
+
+
+def get_paginated_questions(page=1, q_per_page=QUESTIONS_PER_PAGE, search_term=None, category_id=None, after_id=None):
+    rows = question_page_query(
+        page, q_per_page, search_term, category_id, after_id).all()
+
+    if not rows:
+        return None
+
+    questions = [Question.format_row(row) for row in rows[:q_per_page]]
+
+    # The extra row fetched above only tells us whether another page exists
+    next_cursor = None
+    if len(rows) > q_per_page:
+        next_cursor = rows[q_per_page - 1].id
+
+    return QuestionPage(questions, rows[0].total, next_cursor)
+
+
+def load_quiz_categories():
+    # A single grouped join returns only the categories that have questions,
+    # along with how many questions each of them has
+    rows = db.session.query(Category.id, Category.type, func.count(Question.id)).join(
+        Question, Question.category == Category.id).group_by(Category.id, Category.type).order_by(Category.id).all()
+
+    formatted_categories = {}
+    question_counts = {}
+
+    for id, type, count in rows:
+        formatted_categories[str(id)] = type
+        question_counts[str(id)] = count
+
+    return formatted_categories, question_counts
+
+
+def load_categories():
+    return {str(id): type for id, type in db.session.query(Category.id, Category.type).order_by(Category.id)}
+
+
+def invalidate_question_caches():
+    # Drops everything held in memory about the questions, after they were
+    # changed in bulk
+    category_cache.invalidate()
+    question_pools.invalidate()
+    search_index.invalidate()
+
+
+def rank_users(users, higher_count=0, tied_count=None):
+    # Ranks a page of users ordered by descending score, users with the same
+    # score sharing a rank. higher_count is the number of users with a higher
+    # score than the first user of the page, tied_count the number of users,
+    # in or before the page, with the same score as the first one
+    if not users:
+        return []
+
+    top_score = users[0].score
+    if tied_count is None:
+        tied_count = sum(1 for user in users if user.score == top_score)
+
+    ranked_users = []
+    lower_start = None
+    rank = higher_count + 1
+
+    for position, user in enumerate(users):
+        if user.score != top_score:
+            if lower_start is None:
+                lower_start = position
+            if user.score != users[position - 1].score:
+                rank = higher_count + tied_count + position - lower_start + 1
+
+        ranked_users.append({
+            'id': user.id,
+            'username': user.username,
+            'score': user.score,
+            'rank': rank
+        })
+
+    return ranked_users
+
+
+def load_leaderboard_snapshot():
+    users = db.session.query(User.id, User.username, User.score).filter(User.score.isnot(None)).order_by(
+        User.score.desc(), User.id).limit(LEADERBOARD_SNAPSHOT_SIZE).all()
+
+    return rank_users(users)
+
+
+def get_leaderboard(limit=LEADERBOARD_PER_PAGE, after_score=None, after_id=None):
+    # The top of the leaderboard comes from the cached snapshot
+    if after_id is None and limit <= LEADERBOARD_SNAPSHOT_SIZE:
+        users = leaderboard_cache.get('top', load_leaderboard_snapshot)
+        page = users[:limit]
+        has_more = len(users) > limit
+    else:
+        # Later pages seek past the cursor on the (score, id) index
+        query = db.session.query(User.id, User.username, User.score).filter(
+            User.score.isnot(None))
+        if after_id is not None:
+            query = query.filter(or_(User.score < after_score, and_(
+                User.score == after_score, User.id > after_id)))
+        users = query.order_by(User.score.desc(), User.id).limit(limit + 1).all()
+        has_more = len(users) > limit
+        users = users[:limit]
+
+        higher_count = tied_count = 0
+        if users:
+            top_score = users[0].score
+            higher_count, tied_count = db.session.query(
+                func.count(User.id).filter(User.score > top_score),
+                func.count(User.id).filter(User.score == top_score)).one()
+        page = rank_users(users, higher_count, tied_count)
+
+    next_cursor = None
+    if has_more and page:
+        next_cursor = {'score': page[-1]['score'], 'id': page[-1]['id']}
+
+    return page, next_cursor
+
+
+def search_questions(search_term, page=1, q_per_page=QUESTIONS_PER_PAGE):
+    # Full-text results are ordered by rank rather than by id, so they are
+    # only paginated by page number
+    if db.engine.dialect.name == 'postgresql':
+        condition, rank = fulltext_condition(search_term)
+        if condition is None:
             return None
 
-    question_count = query.count()
+        rows = db.session.query(*QUESTION_COLUMNS).filter(condition).add_columns(func.count(Question.id).over().label('total')).order_by(
+            rank.desc(), Question.id).offset((page-1)*q_per_page).limit(q_per_page).all()
+        if not rows:
+            return None
+
+        return QuestionPage([Question.format_row(row) for row in rows], rows[0].total, None)
+
+    ranked = search_index.search(search_term)
+    page_ids = [question_id for question_id,
+                score in ranked[(page-1)*q_per_page:page*q_per_page]]
+    if not page_ids:
+        return None
 
-    query = query.order_by(Question.id).offset(
-        (page-1)*q_per_page).limit(q_per_page).all()
+    questions = {row.id: Question.format_row(row) for row in db.session.query(
+        *QUESTION_COLUMNS).filter(Question.id.in_(page_ids))}
 
-    return query
+    return QuestionPage([questions[question_id] for question_id in page_ids if question_id in questions], len(ranked), None)
+
+
+def get_quiz_categories():
+    with reading_from_primary():
+        return category_cache.get('quiz', load_quiz_categories)
 
 
 def get_categories(for_quiz=False):
-    categories = Category.query.order_by(Category.id).all()
+    if for_quiz:
+        return get_quiz_categories()[0]
+
+    with reading_from_primary():
+        return category_cache.get('all', load_categories)
+
+
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    metrics.inc('trivia_db_queries_total')
+
+
+def collect_metrics():
+    '''
+    Returns the metric families of GET /metrics: the recorded counters and
+    histograms, and the state of the caches and of the connection pool
+    '''
+    counters, histograms = metrics.snapshot()
+
+    def samples(name):
+        return [(labels, value) for (metric, labels), value in counters.items() if metric == name]
+
+    started = dict(samples('trivia_http_requests_started_total'))
+    finished = dict(samples('trivia_http_requests_finished_total'))
+    pool = get_pool_status()
+
+    return [
+        ('trivia_http_request_duration_seconds', 'histogram', 'Latency of the requests by route, method and status.',
+         [(labels, value) for (metric, labels), value in histograms.items() if metric == 'trivia_http_request_duration_seconds']),
+        ('trivia_http_requests_in_flight', 'gauge', 'Requests being served by route.',
+         [(labels, count - finished.get(labels, 0)) for labels, count in started.items()]),
+        ('trivia_db_queries_total', 'counter', 'SQL statements run.',
+         samples('trivia_db_queries_total') or [((), 0)]),
+        ('trivia_cache_hits_total', 'counter', 'Lookups served from a cache.',
+         [((('cache', 'categories'),), category_cache.hits), ((('cache', 'leaderboard'),), leaderboard_cache.hits)]),
+        ('trivia_cache_misses_total', 'counter', 'Lookups that read the database.',
+         [((('cache', 'categories'),), category_cache.misses), ((('cache', 'leaderboard'),), leaderboard_cache.misses)]),
+        ('trivia_quiz_sample_retries_total', 'counter', 'Quiz draws retried after finding the question pools stale.',
+         samples('trivia_quiz_sample_retries_total') or [((), 0)]),
+        ('trivia_quiz_sample_fallbacks_total', 'counter', 'Quiz draws that listed the questions still available after random draws kept hitting previous questions.',
+         [((), question_pools.sample_fallbacks)]),
+        ('trivia_db_pool_checked_out', 'gauge', 'Connections in use.',
+         [((), pool.get('checked_out', 0))]),
+        ('trivia_db_pool_overflow', 'gauge', 'Connections open beyond the pool size.',
+         [((), pool.get('overflow', 0))]),
+        ('trivia_db_pool_checkouts_total', 'counter', 'Connections taken from the pool.',
+         [((), pool['checkouts'])]),
+        ('trivia_db_pool_invalidations_total', 'counter', 'Connections found broken and discarded.',
+         [((), pool['invalidations'])]),
+    ]
+
+
+def get_question(question_id):
+    question = Question.query.get(question_id)
+
+    # The question ids come from the pools, which are read from the primary,
+    # so a question missing from a replica may just not have reached it yet
+    if question is None and g.get('replica') is not None:
+        with reading_from_primary():
+            question = Question.query.get(question_id)
 
-    formatted_categories = {}
+    return question
 
-    for category in categories:
-        if for_quiz:
-            if get_paginated_questions(category_id=category.format()['id']) is not None:
-                formatted_categories[str(category.format()['id'])] = category.format()[
-                    'type']
-        else:
-            formatted_categories[str(category.format()['id'])] = category.format()[
-                'type']
 
-    return formatted_categories
+def get_random_question(category_id, previous_questions):
+    # The question is drawn from the in-memory pool of the category, so only
+    # the chosen row is read from the database
+    for attempt in range(2):
+        question_id = question_pools.sample(category_id, previous_questions)
+        if question_id is None:
+            return None
+
+        question = get_question(question_id)
+        if question is not None:
+            return question
+
+        # The question was deleted by another worker, so the pools are stale
+        metrics.inc('trivia_quiz_sample_retries_total')
+        question_pools.invalidate()
+
+    return None
 
 
 def create_app(test_config=None):
+    # Milliseconds spent in each step of the startup
+    started = time.perf_counter()
+    timings = {}
+
+    def record(step, since):
+        now = time.perf_counter()
+        timings[step] = round((now - since) * 1000, 2)
+        return now
+
     # create and configure the app
     app = Flask(__name__)
-    setup_db(app)
+    if test_config is not None:
+        app.config.from_mapping(test_config)
+    app.json = get_json_provider_class(
+        app.config.get('JSON_PROVIDER', JSON_PROVIDER))(app)
+    step = record('config', started)
+    setup_db(app, app.config.get('DATABASE_PATH', database_path),
+             app.config.get('DATABASE_REPLICAS', DATABASE_REPLICA_URLS))
+    step = record('setup_db', step)
+    setup_schema(app, app.config.get('SCHEMA_MODE', SCHEMA_MODE),
+                 strict=not loaded_for_cli_command())
+    step = record('schema', step)
+    score_buffer.start(app)
+
+    # Registered first so its after_request hook runs last, and the
+    # reported duration covers the other hooks, such as compression
+    if app.config.get('SQL_INSTRUMENTATION', SQL_INSTRUMENTATION):
+        instrument(app)
+
+    metrics_enabled = app.config.get('METRICS_ENABLED', METRICS_ENABLED)
+    if metrics_enabled:
+        if not event.contains(Engine, 'after_cursor_execute', count_query):
+            event.listen(Engine, 'after_cursor_execute', count_query)
+
+        @app.before_request
+        def start_metrics():
+            # Routes are labelled by their rule, so ids in URLs don't each
+            # make a series of their own
+            g.metrics_route = request.url_rule.rule if request.url_rule else 'unmatched'
+            g.metrics_started = time.perf_counter()
+            metrics.inc('trivia_http_requests_started_total',
+                        (('route', g.metrics_route),))
+
+        @app.after_request
+        def record_metrics(response):
+            if 'metrics_started' in g:
+                metrics.observe('trivia_http_request_duration_seconds', time.perf_counter() - g.metrics_started, (
+                    ('route', g.metrics_route), ('method', request.method), ('status', str(response.status_code))))
+            return response
+
+        @app.teardown_request
+        def finish_metrics(error):
+            # Runs even when the request failed before its response was made
+            if 'metrics_route' in g:
+                metrics.inc('trivia_http_requests_finished_total',
+                            (('route', g.metrics_route),))
 
     """
     @TODO: Set up CORS. Allow '*' for origins. Delete the sample route after completing the TODOs
@@ -85,6 +488,22 @@ def create_app(test_config=None):
         response.headers.add(
             "Access-Control-Allow-Methods", "GET,PUT,POST,DELETE,OPTIONS"
         )
+
+        if g.get('etag') and response.status_code in (200, 304):
+            response.set_etag(g.etag, weak=True)
+            response.vary.add('Accept-Encoding')
+            response.headers['Cache-Control'] = f'public, max-age={HTTP_CACHE_MAX_AGE}, must-revalidate'
+
+        # Replicas may not have the changes of a write yet, so the client
+        # reads from the primary for a while
+        if app.config["REPLICA_BINDS"] and request.method not in ('GET', 'HEAD', 'OPTIONS') and not g.get('read_only') and not g.get('quiz_sessions_only') and response.status_code < 400:
+            response.set_cookie(READ_PRIMARY_COOKIE, str(time.time() + REPLICA_STICKY_SECONDS),
+                                max_age=REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax')
+
+        if app.config.get('RESPONSE_COMPRESSION', RESPONSE_COMPRESSION):
+            response = compress_response(response, request.accept_encodings, app.config.get(
+                'COMPRESSION_MIN_SIZE', COMPRESSION_MIN_SIZE))
+
         return response
 
     """
@@ -93,14 +512,22 @@ def create_app(test_config=None):
     for all available categories.
     """
     @app.route(f"{BASE_URL}/categories")
+    @read_only
+    @conditional
     def retrieve_categories():
         try:
-            categories = get_categories(
-                for_quiz=request.args.get("quiz", False, type=bool))
+            if request.args.get("quiz", False, type=bool):
+                categories, question_counts = get_quiz_categories()
+
+                return jsonify({
+                    "success": True,
+                    "categories": categories,
+                    "question_counts": question_counts
+                })
 
             return jsonify({
                 "success": True,
-                "categories": categories
+                "categories": get_categories()
             })
         except:
             abort(500)
@@ -117,12 +544,11 @@ def create_app(test_config=None):
             except:
                 raise
 
-            category = Category.query.filter(
-                Category.type.ilike(str(incoming_category))).first()
+            # The unique index on lower(type) rejects duplicates in the same statement as the insert
+            new_category = Category(type=incoming_category)
 
-            if category is None:
-                new_category = Category(type=request.get_json()['category'])
-                new_category.insert()
+            if insert_unique(new_category, Category.type):
+                category_cache.invalidate()
 
                 return (jsonify({
                     "status_code": 201,
@@ -147,22 +573,23 @@ def create_app(test_config=None):
     Clicking on the page numbers should update the questions.
     """
     @app.route(f'{BASE_URL}/questions')
+    @read_only
+    @conditional
     def retrieve_questions():
         try:
             page = request.args.get('page', 1, type=int)
+            after_id = request.args.get('after_id', None, type=int)
             questions = get_paginated_questions(
-                page=page)
+                page=page, after_id=after_id)
 
             if not questions:
                 raise
 
-            return_questions = []
-            for question in questions:
-                return_questions.append(question.format())
             return jsonify({
                 "success": True,
-                "questions": return_questions,
-                "total_questions": question_count,
+                "questions": questions.questions,
+                "total_questions": questions.total,
+                "next_cursor": questions.next_cursor,
                 "categories": get_categories(),
                 "current_category": 0
             })
@@ -180,6 +607,9 @@ def create_app(test_config=None):
         try:
             question = Question.query.get(question_id)
             question.delete()
+            category_cache.invalidate()
+            question_pools.remove(question.id, question.category)
+            search_index.remove(question.id, question.question)
 
             return jsonify({
                 "success": True,
@@ -201,24 +631,32 @@ def create_app(test_config=None):
             only question that include that string within their question.
             Try using the word "title" to start.
             """
+            # Searching doesn't write, so it doesn't pin the client to the
+            # primary as creating a question does
+            mark_read_only()
             if request.get_json()["search_term"] == '':
                 abort(422)
+            search_mode = request.get_json().get('search_mode', SEARCH_MODE)
+            if search_mode not in SEARCH_MODES:
+                abort(400)
             try:
                 search_term = request.get_json()["search_term"]
                 page = request.args.get('page', 1, type=int)
-                questions = get_paginated_questions(
-                    search_term=search_term, page=page)
+                after_id = request.args.get('after_id', None, type=int)
+                if search_mode == 'fulltext':
+                    questions = search_questions(search_term, page=page)
+                else:
+                    questions = get_paginated_questions(
+                        search_term=search_term, page=page, after_id=after_id)
 
                 if not questions:
                     raise
 
-                return_questions = []
-                for question in questions:
-                    return_questions.append(question.format())
                 return jsonify({
                     "success": True,
-                    "questions": return_questions,
-                    "total_questions": question_count,
+                    "questions": questions.questions,
+                    "total_questions": questions.total,
+                    "next_cursor": questions.next_cursor,
                     "current_category": 0
                 })
             except:
@@ -249,18 +687,19 @@ def create_app(test_config=None):
                 if not (question and answer and category and difficulty):
                     raise
 
-                case_question = Question.query.filter(
-                    Question.question.ilike(str(question))).first()
+                # The unique index on lower(question) rejects duplicates in the same statement as the insert
+                new_question = Question(
+                    question=question,
+                    answer=answer,
+                    category=category,
+                    difficulty=difficulty,
+                    rating=rating
+                )
 
-                if case_question is None:
-                    new_question = Question(
-                        question=question,
-                        answer=answer,
-                        category=category,
-                        difficulty=difficulty,
-                        rating=rating
-                    )
-                    new_question.insert()
+                if insert_unique(new_question, Question.question):
+                    category_cache.invalidate()
+                    question_pools.add(new_question.id, category)
+                    search_index.add(new_question.id, question)
 
                     return (jsonify({
                         "status_code": 201,
@@ -273,6 +712,41 @@ def create_app(test_config=None):
             except:
                 abort(get_error_code())
 
+    @app.route(f'{BASE_URL}/questions/import', methods=['POST'])
+    def import_questions_file():
+        format = request.args.get(
+            'format', 'csv' if request.mimetype == 'text/csv' else 'jsonl')
+        chunk_size = request.args.get('chunk_size', IMPORT_CHUNK_SIZE, type=int)
+        if format not in IMPORT_FORMATS or chunk_size < 1:
+            abort(400)
+
+        try:
+            # The body is read line by line, so large files are never held in memory
+            lines = io.TextIOWrapper(request.stream, encoding='utf-8', newline='')
+            report = import_questions(lines, format, chunk_size)
+            invalidate_question_caches()
+
+            return jsonify({
+                "success": True,
+                **report
+            })
+        except:
+            invalidate_question_caches()
+            abort(422)
+
+    @app.route(f'{BASE_URL}/questions/export')
+    @read_only
+    def export_questions_file():
+        format = request.args.get('format', 'jsonl')
+        category_id = request.args.get('category', None, type=int)
+        if format not in EXPORT_FORMATS:
+            abort(400)
+
+        # The questions are sent as they are read, so the response is never held in memory
+        return Response(stream_with_context(export_questions(format, category_id)),
+                        mimetype='text/csv' if format == 'csv' else 'application/x-ndjson',
+                        headers={"Content-Disposition": f'attachment; filename=questions.{format}'})
+
     @app.route(f'{BASE_URL}/questions/<int:id>', methods=['PATCH'])
     def update_rating(id):
         set_error_code(500)
@@ -301,23 +775,25 @@ def create_app(test_config=None):
     category to be shown.
     """
     @app.route(f'{BASE_URL}/categories/<int:category_id>/questions')
+    @read_only
+    @conditional
     def get_questions_by_category(category_id):
         try:
             page = request.args.get('page', 1, type=int)
+            after_id = request.args.get('after_id', None, type=int)
             questions = get_paginated_questions(
-                category_id=category_id, page=page)
+                category_id=category_id, page=page, after_id=after_id)
 
             if not questions:
                 raise
 
-            return_questions = []
-            for question in questions:
-                return_questions.append(question.format())
             return jsonify({
                 "success": True,
-                "questions": return_questions,
-                "total_questions": question_count,
-                "current_category": Category.query.get(category_id).format()['id']
+                "questions": questions.questions,
+                "total_questions": questions.total,
+                "next_cursor": questions.next_cursor,
+                # Questions only refer to existing categories
+                "current_category": category_id
             })
         except:
             abort(404)
@@ -334,53 +810,158 @@ def create_app(test_config=None):
     and shown whether they were correct or not.
     """
     @app.route(f'{BASE_URL}/quizzes', methods=['POST'])
+    @read_only
     def load_quiz():
         set_error_code(500)
         try:
             try:
                 # Confirm that the request has the right parameters then assign it to variables
-                category_id = request.get_json()['quiz_category']['id']
+                category_id = int(request.get_json()['quiz_category']['id'])
                 previous_questions = request.get_json()['previous_questions']
+                if not isinstance(previous_questions, list):
+                    raise
+                previous_questions = {int(id) for id in previous_questions}
             except:
                 set_error_code(400)
                 raise
 
-            # Guard to return a 404 error if the category provided does not have questions assigned to it
-            test_question = Question.query.filter(
-                Question.category == category_id).first()
-            if test_question is None and category_id != 0:
-                set_error_code(404)
-                raise
+            question = get_random_question(category_id, previous_questions)
 
-            # Guard to return an empty dictionary if the amount of questions already attempted is equal to the amount of questions available for that category, or more than, due to an error in the client's request
-            if not category_id == 0 and Question.query.filter(Question.category == category_id).count() <= len(previous_questions):
+            if question is None:
+                # Guard to return a 404 error if the category provided does not have questions assigned to it
+                if category_id != 0 and Question.query.filter(Question.category == category_id).first() is None:
+                    set_error_code(404)
+                    raise
+
+                # Every question available for the category has already been attempted
                 return jsonify({
                     "success": True,
                     "question": {},
                 })
 
-            # Attempt to retrieve questions based on the category id provided
-            upper_range = Question.query.order_by(
-                Question.id.desc()).first().format()['id'] + 1
+            return jsonify({
+                "success": True,
+                "question": question.format(),
+            })
+        except:
+            abort(get_error_code())
+
+    @app.route(f'{BASE_URL}/quizzes/batch', methods=['POST'])
+    @read_only
+    def load_quiz_batch():
+        set_error_code(500)
+        try:
+            try:
+                # Confirm that the request has the right parameters then assign it to variables
+                category_id = int(request.get_json()['quiz_category']['id'])
+                previous_questions = request.get_json().get('previous_questions', [])
+                count = int(request.get_json()['count'])
+                seed = request.get_json().get('seed')
+                if not isinstance(previous_questions, list) or not 0 < count <= MAX_QUIZ_BATCH:
+                    raise
+                if seed is not None and not isinstance(seed, (int, str)):
+                    raise
+                previous_questions = {int(id) for id in previous_questions}
+                rng = random.Random(seed) if seed is not None else random
+            except:
+                set_error_code(400)
+                raise
+
+            question_ids = question_pools.sample_many(
+                category_id, previous_questions, count, rng)
+
+            # Guard to return a 404 error if the category provided does not have questions assigned to it
+            if not question_ids and not question_pools.ids(category_id):
+                set_error_code(404)
+                raise
+
+            # All the questions are read with a single query, then returned in the order they were drawn
+            questions = {row.id: Question.format_row(row) for row in db.session.query(
+                *QUESTION_COLUMNS).filter(Question.id.in_(question_ids))}
+
+            return jsonify({
+                "success": True,
+                "questions": [questions[id] for id in question_ids if id in questions],
+            })
+        except:
+            abort(get_error_code())
+
+    @app.route(f'{BASE_URL}/quizzes/sessions', methods=['POST'])
+    @writes_quiz_sessions
+    def create_quiz_session():
+        set_error_code(500)
+        try:
+            try:
+                category_id = int(request.get_json()['quiz_category']['id'])
+            except:
+                set_error_code(400)
+                raise
+
+            question_ids = question_pools.ids(category_id)
+            if not question_ids:
+                set_error_code(404)
+                raise
+
+            session_id = quiz_sessions.create(question_ids)
+
+            return (jsonify({
+                "status_code": 201,
+                "success": True,
+                "session_id": session_id,
+                "total_questions": len(question_ids),
+                "expires_in": quiz_sessions.ttl
+            }), 201)
+        except:
+            abort(get_error_code())
+
+    @app.route(f'{BASE_URL}/quizzes/sessions/<session_id>/next')
+    def get_next_session_question(session_id):
+        set_error_code(500)
+        try:
+            while True:
+                try:
+                    question_id, remaining = quiz_sessions.next_question_id(
+                        session_id)
+                except KeyError:
+                    set_error_code(404)
+                    raise
 
-            q = None
-            while q is None or q.format()['id'] in previous_questions:
-                rand_id = random.randrange(1, upper_range)
-                q = Question.query.get(rand_id) if category_id == 0 else Question.query.filter(
-                    Question.id == rand_id, Question.category == category_id).first()
+                if question_id is None:
+                    return jsonify({
+                        "success": True,
+                        "question": {},
+                        "remaining": 0
+                    })
+
+                # Questions deleted since the session started are skipped
+                question = get_question(question_id)
+                if question is not None:
+                    break
 
             return jsonify({
                 "success": True,
-                "question": q.format(),
+                "question": question.format(),
+                "remaining": remaining
             })
         except:
             abort(get_error_code())
 
+    @app.route(f'{BASE_URL}/quizzes/sessions/<session_id>', methods=['DELETE'])
+    @writes_quiz_sessions
+    def delete_quiz_session(session_id):
+        if not quiz_sessions.delete(session_id):
+            abort(404)
+
+        return jsonify({
+            "success": True
+        })
+
     @app.route(f'{BASE_URL}/users')
+    @read_only
     def get_users():
         try:
-            users = User.query.order_by(User.id).all()
-            return_users = [user.format() for user in users]
+            return_users = [User.format_row(row) for row in db.session.query(
+                *USER_COLUMNS).order_by(User.id)]
 
             return jsonify({
                 "success": True,
@@ -389,15 +970,78 @@ def create_app(test_config=None):
         except:
             abort(500)
 
+    @app.route(f'{BASE_URL}/leaderboard')
+    @read_only
+    def retrieve_leaderboard():
+        set_error_code(500)
+        try:
+            try:
+                limit = request.args.get('limit', LEADERBOARD_PER_PAGE, type=int)
+                after_score = request.args.get('after_score', None, type=int)
+                after_id = request.args.get('after_id', None, type=int)
+                if not 0 < limit <= LEADERBOARD_SNAPSHOT_SIZE or (after_score is None) != (after_id is None):
+                    raise
+            except:
+                set_error_code(400)
+                raise
+
+            users, next_cursor = get_leaderboard(
+                limit=limit, after_score=after_score, after_id=after_id)
+
+            return jsonify({
+                "success": True,
+                "users": users,
+                "next_cursor": next_cursor
+            })
+        except:
+            abort(get_error_code())
+
+    @app.route(f'{BASE_URL}/users/<int:id>/rank')
+    @read_only
+    def get_user_rank(id):
+        try:
+            user = db.session.query(User.id, User.username, User.score).filter(
+                User.id == id, User.score.isnot(None)).first()
+            if user is None:
+                raise
+
+            higher_count = db.session.query(func.count(User.id)).filter(
+                User.score > user.score).scalar()
+
+            return jsonify({
+                "success": True,
+                "user": {
+                    'id': user.id,
+                    'username': user.username,
+                    'score': user.score,
+                    'rank': higher_count + 1
+                }
+            })
+        except:
+            abort(404)
+
     @app.route(f'{BASE_URL}/users/<int:id>', methods=['PATCH'])
     def update_user_score(id):
         try:
-            user = User.query.get(id)
-            user.score = user.score + int(request.get_json()['score'])
-            user.update()
+            delta = int(request.get_json()['score'])
+
+            if score_buffer.enabled:
+                # The response adds the increments not yet written to the stored score
+                with score_buffer.settled():
+                    row = db.session.query(User.score).filter(
+                        User.id == id).first()
+                    if row is None:
+                        raise
+                    score_buffer.add(id, delta)
+                    score = (row.score or 0) + score_buffer.pending(id)
+            else:
+                score = User.add_to_score(id, delta)
+                if score is None:
+                    raise
+
             return jsonify({
                 "success": True,
-                "score": user.score
+                "score": score
             })
         except:
             abort(400)
@@ -415,13 +1059,11 @@ def create_app(test_config=None):
             except:
                 raise
 
-            user = User.query.filter(
-                User.username.ilike(str(incoming_username))).first()
+            # The unique index on lower(username) rejects duplicates in the same statement as the insert
+            new_user = User(username=incoming_username, score=int(request.get_json()[
+                            'score']) if 'score' in request.get_json() else 0)
 
-            if user is None:
-                new_user = User(username=request.get_json()['username'], score=int(request.get_json()[
-                                'score']) if 'score' in request.get_json() else 0)
-                new_user.insert()
+            if insert_unique(new_user, User.username):
 
                 return (jsonify({
                     "status_code": 201,
@@ -434,6 +1076,65 @@ def create_app(test_config=None):
         except:
             abort(get_error_code())
 
+    @app.route('/metrics')
+    def get_metrics():
+        if not metrics_enabled:
+            abort(404)
+
+        return Response(render_metrics(collect_metrics()), content_type=METRICS_CONTENT_TYPE)
+
+    @app.route(f'{BASE_URL}/pool')
+    def get_pool_stats():
+        return jsonify({
+            "success": True,
+            "pool": get_pool_status()
+        })
+
+    @app.route(f'{BASE_URL}/cache')
+    def get_cache_stats():
+        return jsonify({
+            "success": True,
+            "categories": category_cache.stats(),
+            "question_pools": question_pools.stats()
+        })
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        """Create the schema of an empty database or migrate an existing one."""
+        init_db()
+        click.echo('The database schema is up to date.')
+
+    @app.cli.command('startup-timings')
+    def startup_timings_command():
+        """Show how long each step of the app startup took, in milliseconds."""
+        click.echo(json.dumps(app.config['STARTUP_TIMINGS'], indent=2))
+
+    @app.cli.command('import-questions')
+    @click.argument('path', type=click.Path(exists=True, dir_okay=False))
+    @click.option('--format', type=click.Choice(IMPORT_FORMATS), help='Defaults to csv for .csv files, jsonl otherwise.')
+    @click.option('--chunk-size', default=IMPORT_CHUNK_SIZE, show_default=True, help='Rows validated and inserted per transaction.')
+    def import_questions_command(path, format, chunk_size):
+        """Import questions from a JSON Lines or CSV file."""
+        format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+
+        with open(path, encoding='utf-8', newline='') as lines:
+            report = import_questions(lines, format, chunk_size)
+        invalidate_question_caches()
+
+        click.echo(json.dumps(report, indent=2))
+
+    @app.cli.command('export-questions')
+    @click.argument('path', type=click.Path(dir_okay=False, writable=True))
+    @click.option('--format', type=click.Choice(EXPORT_FORMATS), help='Defaults to csv for .csv files, jsonl otherwise.')
+    @click.option('--category', type=int, help='Only export the questions of this category.')
+    def export_questions_command(path, format, category):
+        """Export questions to a JSON Lines or CSV file."""
+        format = format or ('csv' if path.endswith('.csv') else 'jsonl')
+
+        with open(path, 'w', encoding='utf-8', newline='') as output:
+            for chunk in export_questions(format, category):
+                output.write(chunk)
+
     """
     @TODO:
     Create error handlers for all expected errors
@@ -517,4 +1218,9 @@ def create_app(test_config=None):
             500,
         )
 
+    record('routes', step)
+    timings['total'] = round((time.perf_counter() - started) * 1000, 2)
+    app.config['STARTUP_TIMINGS'] = timings
+    app.logger.info('Started in %s ms %s', timings['total'], timings)
+
     return app
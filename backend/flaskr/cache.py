@@ -0,0 +1,56 @@
+import threading
+import time
+
+
+class Cache:
+    '''
+    Cache
+        a small process-local key/value cache. Entries expire after `ttl`
+        seconds when a ttl is given, otherwise they live until the cache is
+        invalidated. Values are shared between callers and must be treated
+        as read-only.
+    '''
+
+    def __init__(self, ttl=None):
+        self.ttl = ttl or None
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def get(self, key, load):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+                self.hits += 1
+                return entry[0]
+
+            self.misses += 1
+            generation = self._generation
+
+        # Loaded without the lock, so a slow load doesn't hold up the hits
+        value = load()
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            # Don't store a value loaded while the cache was being invalidated,
+            # it may already be stale
+            if generation == self._generation:
+                self._entries[key] = (value, expires_at)
+
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'size': len(self._entries),
+                'ttl': self.ttl
+            }
@@ -0,0 +1,55 @@
+import gzip
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Listings are sent as JSON, exports and errors of other kinds as text
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/csv', 'text/plain')
+GZIP_LEVEL = 6
+# Higher brotli qualities compress a little better but are far slower,
+# which doesn't pay off for responses compressed on every request
+BROTLI_QUALITY = 5
+
+
+def get_encodings():
+    '''
+    Returns the supported content encodings, preferred first
+    '''
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def compress_response(response, accept_encodings, min_size):
+    '''
+    Compresses the body of the response with the best encoding the client
+    accepts when it is at least `min_size` bytes long. Streamed responses,
+    such as exports, are sent as they are
+    '''
+    if response.mimetype not in COMPRESSIBLE_MIMETYPES or response.is_streamed or response.direct_passthrough:
+        return response
+
+    response.vary.add('Accept-Encoding')
+
+    if response.status_code != 200 or 'Content-Encoding' in response.headers or response.content_length < min_size:
+        return response
+
+    encoding = accept_encodings.best_match(get_encodings())
+    if encoding is None:
+        return response
+
+    data = response.get_data()
+    if encoding == 'br':
+        response.set_data(brotli.compress(data, quality=BROTLI_QUALITY))
+    else:
+        response.set_data(gzip.compress(
+            data, compresslevel=GZIP_LEVEL, mtime=0))
+    response.headers['Content-Encoding'] = encoding
+
+    # The compressed body is not byte-for-byte the tagged one, so the tag
+    # becomes weak, which If-None-Match still matches
+    etag, weak = response.get_etag()
+    if etag is not None and not weak:
+        response.set_etag(etag, weak=True)
+
+    return response
@@ -0,0 +1,47 @@
+import csv
+import io
+import json
+
+from models import db, Question
+
+EXPORT_FORMATS = ('jsonl', 'csv')
+EXPORT_COLUMNS = ('id', 'question', 'answer',
+                  'category', 'difficulty', 'rating')
+EXPORT_BATCH_SIZE = 1000
+
+
+def export_questions(format='jsonl', category_id=None, batch_size=EXPORT_BATCH_SIZE):
+    '''
+    Yields every question, optionally of a single category, as JSON Lines or
+    CSV text, a batch of rows at a time. The rows are read through a
+    server-side cursor, so memory use doesn't grow with the table. The output
+    can be imported back with import_questions
+    '''
+    query = db.session.query(Question.id, Question.question, Question.answer,
+                             Question.category, Question.difficulty, Question.rating)
+    if category_id is not None:
+        query = query.filter(Question.category == category_id)
+
+    buffer = io.StringIO()
+    writer = csv.writer(buffer) if format == 'csv' else None
+    if writer is not None:
+        writer.writerow(EXPORT_COLUMNS)
+
+    for count, row in enumerate(query.order_by(Question.id).yield_per(batch_size), start=1):
+        values = dict(zip(EXPORT_COLUMNS, row))
+        if values['category'] is not None:
+            values['category'] = int(values['category'])
+
+        if writer is not None:
+            writer.writerow(values.values())
+        else:
+            buffer.write(json.dumps(values))
+            buffer.write('\n')
+
+        if count % batch_size == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+
+    if buffer.tell():
+        yield buffer.getvalue()
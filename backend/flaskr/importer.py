@@ -0,0 +1,148 @@
+import csv
+import json
+import time
+from itertools import islice
+
+from sqlalchemy import func
+
+from models import db, insert_ignoring_conflicts, Question, Category
+
+IMPORT_FORMATS = ('jsonl', 'csv')
+IMPORT_CHUNK_SIZE = 1000
+# Rows per INSERT statement. Each page is a single multi-row statement, whose
+# row count the drivers report exactly, and stays below SQLite's limit of
+# 999 bound parameters
+INSERT_PAGE_SIZE = 100
+# Only the first errors are listed in the report, the others are counted
+MAX_REPORTED_ERRORS = 1000
+
+
+def read_rows(lines, format):
+    '''
+    Yields the (row number, row) pairs of a JSON Lines or CSV stream of
+    questions. A row that can't be parsed is yielded as None
+    '''
+    if format == 'csv':
+        # The header is row 1, so data rows start at 2
+        for number, row in enumerate(csv.DictReader(lines), start=2):
+            yield number, row
+        return
+
+    for number, line in enumerate(lines, start=1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError:
+            row = None
+        yield number, row if isinstance(row, dict) else None
+
+
+def validate_row(row, category_ids):
+    '''
+    Returns the values to insert for a row and None, or None and the reason
+    the row is invalid
+    '''
+    if row is None:
+        return None, 'invalid row'
+
+    try:
+        question = str(row['question'] or '').strip()
+        answer = str(row['answer'] or '').strip()
+        category = int(row['category'])
+        difficulty = int(row['difficulty'])
+        rating = int(row['rating']) if row.get('rating') not in (None, '') else 3
+    except (KeyError, TypeError, ValueError):
+        return None, 'question, answer, category and difficulty are required, category, difficulty and rating must be integers'
+
+    if not (question and answer and difficulty):
+        return None, 'question, answer and difficulty must not be empty'
+
+    if category not in category_ids:
+        return None, f'category {category} does not exist'
+
+    return {
+        'question': question,
+        'answer': answer,
+        'category': category,
+        'difficulty': difficulty,
+        'rating': rating
+    }, None
+
+
+def import_chunk(chunk, category_ids, report):
+    values = []
+    # Questions already met in the chunk. Those of earlier chunks are in the
+    # database by now, so the query below finds them
+    seen = set()
+
+    for number, row in chunk:
+        question, message = validate_row(row, category_ids)
+        if question is None:
+            report['error_count'] += 1
+            if len(report['errors']) < MAX_REPORTED_ERRORS:
+                report['errors'].append({'row': number, 'message': message})
+            continue
+
+        key = question['question'].lower()
+        if key in seen:
+            report['duplicates'] += 1
+            continue
+
+        seen.add(key)
+        values.append(question)
+
+    if not values:
+        return
+
+    # One set-based query finds which of the chunk's questions already exist
+    existing = {key for key, in db.session.query(func.lower(Question.question)).filter(
+        func.lower(Question.question).in_(seen))}
+    values = [question for question in values if question['question'].lower()
+              not in existing]
+    report['duplicates'] += len(seen) - len(values)
+
+    if values:
+        # Questions added by someone else since the check above are skipped
+        # by the unique index instead of failing the whole chunk, and counted
+        # as duplicates
+        inserted = 0
+        for start in range(0, len(values), INSERT_PAGE_SIZE):
+            inserted += db.session.execute(insert_ignoring_conflicts(
+                Question.__table__, Question.question).values(values[start:start + INSERT_PAGE_SIZE])).rowcount
+        report['inserted'] += inserted
+        report['duplicates'] += len(values) - inserted
+
+    db.session.commit()
+
+
+def import_questions(lines, format='jsonl', chunk_size=IMPORT_CHUNK_SIZE):
+    '''
+    Imports a stream of questions in JSON Lines or CSV format, validating,
+    deduplicating and inserting them a chunk at a time, each chunk in its
+    own transaction. Returns a report of the import
+    '''
+    started = time.perf_counter()
+    category_ids = {id for id, in db.session.query(Category.id)}
+    report = {
+        'rows': 0,
+        'inserted': 0,
+        'duplicates': 0,
+        'error_count': 0,
+        'errors': []
+    }
+
+    rows = read_rows(lines, format)
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            break
+
+        report['rows'] += len(chunk)
+        import_chunk(chunk, category_ids, report)
+
+    seconds = time.perf_counter() - started
+    report['seconds'] = round(seconds, 3)
+    report['rows_per_second'] = round(report['rows'] / seconds) if seconds else 0
+
+    return report
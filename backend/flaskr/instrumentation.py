@@ -0,0 +1,95 @@
+import json
+import time
+
+from flask import g, has_app_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# Statements are cut in the logs, as some list hundreds of ids
+MAX_LOGGED_STATEMENT = 500
+
+
+class QueryStats:
+    '''
+    QueryStats
+        the number of SQL statements a request ran, the time spent in them
+        and the slowest of them
+    '''
+
+    __slots__ = ('count', 'duration_ms', 'slowest_ms', 'slowest_statement')
+
+    def __init__(self):
+        self.count = 0
+        self.duration_ms = 0.0
+        self.slowest_ms = 0.0
+        self.slowest_statement = None
+
+    def add(self, statement, duration_ms):
+        self.count += 1
+        self.duration_ms += duration_ms
+        if duration_ms >= self.slowest_ms:
+            self.slowest_ms = duration_ms
+            self.slowest_statement = statement
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('query_started', []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info['query_started'].pop()
+
+    # Statements run outside of an instrumented request, e.g. by the score
+    # buffer or a command, are not recorded
+    stats = g.get('query_stats') if has_app_context() else None
+    if stats is not None:
+        stats.add(statement, (time.perf_counter() - started) * 1000)
+
+
+def handle_error(exception_context):
+    # A failed statement never reaches after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get('query_started'):
+        connection.info['query_started'].pop()
+
+
+def instrument(app):
+    '''
+    Records the SQL statements of every request of the app, and reports them
+    in a Server-Timing header and in a log line of JSON at the INFO level
+    '''
+    # The listeners are shared by every engine, including the replicas
+    if not event.contains(Engine, 'before_cursor_execute', before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', after_cursor_execute)
+        event.listen(Engine, 'handle_error', handle_error)
+
+    @app.before_request
+    def start_recording():
+        g.request_started = time.perf_counter()
+        g.query_stats = QueryStats()
+
+    @app.after_request
+    def report_queries(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+
+        duration_ms = (time.perf_counter() - g.request_started) * 1000
+        response.headers.add(
+            'Server-Timing', f'db;dur={stats.duration_ms:.2f};desc="{stats.count} queries"')
+        response.headers.add('Server-Timing', f'app;dur={duration_ms:.2f}')
+
+        app.logger.info(json.dumps({
+            'method': request.method,
+            'path': request.full_path.rstrip('?'),
+            'endpoint': request.endpoint,
+            'status': response.status_code,
+            'duration_ms': round(duration_ms, 2),
+            'queries': stats.count,
+            'db_ms': round(stats.duration_ms, 2),
+            'slowest_query_ms': round(stats.slowest_ms, 2),
+            'slowest_query': (stats.slowest_statement or '')[:MAX_LOGGED_STATEMENT] or None
+        }))
+
+        return response
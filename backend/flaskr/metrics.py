@@ -0,0 +1,143 @@
+import threading
+from bisect import bisect_left
+
+# The default buckets of the Prometheus client libraries, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1,
+                   0.25, 0.5, 1, 2.5, 5, 10)
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+class Metrics:
+    '''
+    Metrics
+        counters and histograms recorded without locks: each thread writes to
+        its own shard, and the shards are only added up when the metrics are
+        read. The shards of threads that have ended are folded into a single
+        one, so servers starting a thread per request don't pile them up.
+        Labels are given as a tuple of (name, value) pairs.
+    '''
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._local = threading.local()
+        # (thread, shard) pairs of the threads that recorded something
+        self._shards = []
+        self._retired = self._new_shard()
+        # Only taken when a thread records its first value and when reading
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _new_shard():
+        return {'counters': {}, 'histograms': {}}
+
+    def _shard(self):
+        shard = getattr(self._local, 'shard', None)
+        if shard is None:
+            shard = self._local.shard = self._new_shard()
+            with self._lock:
+                self._retire_ended_threads()
+                self._shards.append((threading.current_thread(), shard))
+
+        return shard
+
+    def _retire_ended_threads(self):
+        alive = []
+        for thread, shard in self._shards:
+            if thread.is_alive():
+                alive.append((thread, shard))
+            else:
+                self._merge(self._retired, shard)
+        self._shards = alive
+
+    def _merge(self, total, shard):
+        for key, value in list(shard['counters'].items()):
+            total['counters'][key] = total['counters'].get(key, 0) + value
+
+        for key, (counts, value_sum) in list(shard['histograms'].items()):
+            entry = total['histograms'].setdefault(
+                key, [[0] * (len(self.buckets) + 1), 0.0])
+            entry[0] = [a + b for a, b in zip(entry[0], counts)]
+            entry[1] += value_sum
+
+    def inc(self, name, labels=(), amount=1):
+        counters = self._shard()['counters']
+        key = (name, labels)
+        counters[key] = counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        histograms = self._shard()['histograms']
+        key = (name, labels)
+        entry = histograms.get(key)
+        if entry is None:
+            entry = histograms[key] = [[0] * (len(self.buckets) + 1), 0.0]
+
+        # The last count is for values above the largest bucket
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def snapshot(self):
+        '''
+        Returns the counters as {(name, labels): value} and the histograms
+        as {(name, labels): [counts per bucket, sum]}, added up over threads
+        '''
+        total = self._new_shard()
+
+        with self._lock:
+            self._retire_ended_threads()
+            self._merge(total, self._retired)
+            for thread, shard in self._shards:
+                # Copies of a dict are made without letting other threads
+                # run, so a shard can be read while its thread writes to it
+                self._merge(total, {'counters': dict(shard['counters']),
+                                    'histograms': {key: [list(counts), value_sum] for key, (counts, value_sum) in dict(shard['histograms']).items()}})
+
+        return total['counters'], total['histograms']
+
+
+def escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels) + '}'
+
+
+def format_value(value):
+    if isinstance(value, float):
+        return repr(value) if value != float('inf') else '+Inf'
+
+    return str(value)
+
+
+def render(families, buckets=LATENCY_BUCKETS):
+    '''
+    Renders metric families in the Prometheus text exposition format. Each
+    family is a (name, type, help, samples) tuple, where samples are
+    (labels, value) pairs, or (labels, [counts per bucket, sum]) pairs for a
+    histogram
+    '''
+    lines = []
+
+    for name, type, help, samples in families:
+        lines.append(f'# HELP {name} {help}')
+        lines.append(f'# TYPE {name} {type}')
+
+        for labels, value in sorted(samples, key=lambda sample: sample[0]):
+            if type != 'histogram':
+                lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+                continue
+
+            counts, value_sum = value
+            cumulative = 0
+            for bucket, count in zip(buckets + (float('inf'),), counts):
+                cumulative += count
+                lines.append(
+                    f'{name}_bucket{format_labels(labels + (("le", format_value(float(bucket))),))} {cumulative}')
+            lines.append(
+                f'{name}_sum{format_labels(labels)} {format_value(float(value_sum))}')
+            lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,240 @@
+import random
+import secrets
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timedelta
+
+from sqlalchemy import and_, delete, func, update
+
+from models import db, get_data_version, reading_from_primary, Question, QuizSession
+
+# How many random draws are tried against the previous questions before
+# falling back to building the list of questions that are still available
+SAMPLE_ATTEMPTS = 16
+
+# Bytes taken by each question id stored in a quiz session
+ID_SIZE = 4
+
+
+def question_pool_query(category_id):
+    '''
+    Returns the query reading the question ids of a category pool, or of every
+    question for category 0
+    '''
+    query = db.session.query(Question.id)
+    if category_id != 0:
+        query = query.filter(Question.category == category_id)
+
+    return query.order_by(Question.id)
+
+
+class QuestionPools:
+    '''
+    QuestionPools
+        per-category pools of question ids kept in memory for the quiz. The
+        pool of a category is read from the database the first time the
+        category is played, then kept up to date by `add` and `remove`. The
+        pool for category 0 holds every question. Every `check_interval`
+        seconds the data version is read, and all pools are dropped when it
+        changed, so questions changed by other processes are picked up. Pools
+        are also rebuilt after `ttl` seconds when a ttl is given, or on
+        `invalidate`.
+    '''
+
+    def __init__(self, ttl=None, check_interval=0):
+        self.ttl = ttl or None
+        self.check_interval = check_interval
+        # Draws that had to build the list of questions still available
+        self.sample_fallbacks = 0
+        # Pools are replaced rather than changed, so a pool taken from here
+        # can be read without holding the lock
+        self._pools = {}
+        self._generation = 0
+        self._version = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def _load(self, category_id):
+        with reading_from_primary():
+            return array('i', (id for id, in question_pool_query(category_id)))
+
+    def _check_version(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+
+        with reading_from_primary():
+            version = get_data_version()
+
+        with self._lock:
+            if version != self._version:
+                self._pools.clear()
+                self._generation += 1
+                self._version = version
+
+    def _get(self, category_id):
+        self._check_version()
+
+        with self._lock:
+            entry = self._pools.get(category_id)
+            generation = self._generation
+
+        if entry is not None and (entry[1] is None or entry[1] > time.monotonic()):
+            return entry[0]
+
+        # Loaded without the lock, so a cold pool doesn't hold up the draws of
+        # other categories. The pool is kept only if nothing changed meanwhile
+        pool = self._load(category_id)
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+
+        with self._lock:
+            if generation == self._generation:
+                self._pools[category_id] = (pool, expires_at)
+
+        return pool
+
+    def sample(self, category_id, previous_questions):
+        '''
+        Returns the id of a random question of the category that is not one of
+        the previous questions, or None if every question was already asked
+        '''
+        previous_questions = set(previous_questions)
+        pool = self._get(int(category_id))
+
+        if len(previous_questions) < len(pool) // 2:
+            for attempt in range(SAMPLE_ATTEMPTS):
+                question_id = pool[random.randrange(len(pool))]
+                if question_id not in previous_questions:
+                    return question_id
+
+        self.sample_fallbacks += 1
+        available = [id for id in pool if id not in previous_questions]
+
+        return random.choice(available) if available else None
+
+    def _keys(self, category_id):
+        # A question is part of the pool of its category and of the pool of
+        # every question
+        return (0,) if category_id is None else (0, int(category_id))
+
+    def sample_many(self, category_id, previous_questions, count, rng=random):
+        '''
+        Returns up to `count` distinct random question ids of the category that
+        are not among the previous questions. The ids are drawn in id order
+        with `rng`, so a seeded random generator always gives the same ids for
+        the same questions
+        '''
+        previous_questions = set(previous_questions)
+        available = sorted(
+            id for id in self._get(int(category_id)) if id not in previous_questions)
+
+        return rng.sample(available, min(count, len(available)))
+
+    def ids(self, category_id):
+        '''
+        Returns a copy of the question ids of the category
+        '''
+        return array('i', self._get(int(category_id)))
+
+    def _replace(self, category_id, change):
+        with self._lock:
+            for key in self._keys(category_id):
+                # Pools that haven't been built yet will read the question
+                # from the database when they are
+                entry = self._pools.get(key)
+                if entry is not None:
+                    pool = array('i', entry[0])
+                    change(pool)
+                    self._pools[key] = (pool, entry[1])
+            # A pool being loaded may have been read before the change
+            self._generation += 1
+
+    def add(self, question_id, category_id):
+        self._replace(category_id, lambda pool: pool.append(question_id))
+
+    def remove(self, question_id, category_id):
+        def remove(pool):
+            if question_id in pool:
+                pool.remove(question_id)
+
+        self._replace(category_id, remove)
+
+    def invalidate(self):
+        with self._lock:
+            self._pools.clear()
+            self._generation += 1
+
+    def stats(self):
+        return {str(key): len(entry[0]) for key, entry in list(self._pools.items())}
+
+
+class QuizSessions:
+    '''
+    QuizSessions
+        quizzes tracked by the server. Each session holds the question ids of
+        its category in a shuffled order and how far the player has gone, so
+        getting the next question doesn't need the previous questions.
+        Sessions are stored in the database, so every worker can serve them. A
+        session expires when it hasn't been used for `ttl` seconds.
+    '''
+
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    def create(self, question_ids):
+        question_ids = array('i', question_ids)
+        random.shuffle(question_ids)
+        if sys.byteorder == 'big':
+            question_ids.byteswap()
+        session_id = secrets.token_urlsafe(16)
+        now = datetime.utcnow()
+
+        # Expired sessions are cleared out as new ones are started
+        db.session.execute(delete(QuizSession).where(
+            QuizSession.expires_at <= now))
+        db.session.add(QuizSession(session_id, question_ids.tobytes(), len(
+            question_ids), now + timedelta(seconds=self.ttl)))
+        db.session.commit()
+
+        return session_id
+
+    def next_question_id(self, session_id):
+        '''
+        Returns the id of the next question of the session and the number of
+        questions left after it, or (None, 0) once every question has been
+        asked. Raises KeyError if the session doesn't exist or has expired
+        '''
+        now = datetime.utcnow()
+        current = and_(QuizSession.id == session_id,
+                       QuizSession.expires_at > now)
+
+        # Moving past the question in a single UPDATE locks the session, so
+        # two requests for it never get the same question
+        advanced = db.session.execute(update(QuizSession).where(
+            current, QuizSession.position < QuizSession.question_count).values(
+            position=QuizSession.position + 1,
+            expires_at=now + timedelta(seconds=self.ttl)).execution_options(
+            synchronize_session=False)).rowcount
+
+        session = db.session.query(
+            func.substr(QuizSession.question_ids,
+                        (QuizSession.position - 1) * ID_SIZE + 1, ID_SIZE).label('question_id'),
+            (QuizSession.question_count - QuizSession.position).label('remaining')).filter(current).one_or_none()
+        db.session.commit()
+
+        if session is None:
+            raise KeyError(session_id)
+        if not advanced:
+            return None, 0
+
+        return int.from_bytes(bytes(session.question_id), 'little', signed=True), session.remaining
+
+    def delete(self, session_id):
+        deleted = db.session.execute(delete(QuizSession).where(
+            QuizSession.id == session_id)).rowcount
+        db.session.commit()
+
+        return deleted > 0
@@ -0,0 +1,98 @@
+import atexit
+import threading
+from contextlib import contextmanager
+
+from models import User
+
+
+class ScoreBuffer:
+    '''
+    ScoreBuffer
+        collects score increments in memory and writes them to the database
+        every `interval` seconds, adding up the increments of each user so a
+        player finishing many quizzes costs one UPDATE per flush. Increments
+        still buffered are lost if the process is killed, so it is only
+        enabled when an interval is given.
+    '''
+
+    def __init__(self, interval=None):
+        self.interval = interval or None
+        self._deltas = {}
+        # Increments taken by a flush, still counted as pending until the
+        # write commits
+        self._flushing = {}
+        self._lock = threading.Lock()
+        # Held for a whole flush, so flushes don't overlap
+        self._flush_lock = threading.Lock()
+        # Held while a flush writes and commits, see `settled`
+        self._write_lock = threading.Lock()
+        self._app = None
+        self._stopped = threading.Event()
+
+    @property
+    def enabled(self):
+        return self.interval is not None
+
+    def start(self, app):
+        if not self.enabled or self._app is not None:
+            return
+
+        self._app = app
+        thread = threading.Thread(
+            target=self._run, name='score-buffer', daemon=True)
+        thread.start()
+        atexit.register(self.stop)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.flush()
+            except Exception:
+                self._app.logger.exception('Failed to write buffered scores')
+
+    def stop(self):
+        self._stopped.set()
+        self.flush()
+
+    def add(self, id, delta):
+        with self._lock:
+            self._deltas[id] = self._deltas.get(id, 0) + delta
+
+    @contextmanager
+    def settled(self):
+        '''
+        Keeps flushes from committing while the stored score and the pending
+        increments are read, so each increment is counted exactly once
+        '''
+        with self._write_lock:
+            yield
+
+    def pending(self, id):
+        with self._lock:
+            return self._deltas.get(id, 0) + self._flushing.get(id, 0)
+
+    def flush(self):
+        if self._app is None:
+            return
+
+        with self._flush_lock:
+            with self._lock:
+                if not self._deltas:
+                    return
+                deltas = self._flushing = self._deltas
+                self._deltas = {}
+
+            with self._write_lock:
+                try:
+                    with self._app.app_context():
+                        User.add_to_scores(deltas)
+                except Exception:
+                    # Keep the increments for the next flush rather than losing them
+                    with self._lock:
+                        for id, delta in deltas.items():
+                            self._deltas[id] = self._deltas.get(id, 0) + delta
+                        self._flushing = {}
+                    raise
+
+                with self._lock:
+                    self._flushing = {}
@@ -0,0 +1,144 @@
+import re
+import threading
+from bisect import bisect_left
+
+from sqlalchemy import func
+
+from models import db, reading_from_primary, Question
+
+SEARCH_MODES = ('substring', 'fulltext')
+TEXT_SEARCH_CONFIG = 'english'
+
+WORD = re.compile(r'\w+')
+
+
+def tokenize(text):
+    return WORD.findall((text or '').lower())
+
+
+def fulltext_condition(search_term):
+    '''
+    Returns the Postgres full-text match condition for the search term and
+    the rank of each matching question. Every word of the term must be found,
+    and the last one may be the beginning of a word, so results show up while
+    the user is still typing. The condition is served by the GIN index on the
+    question's text search vector
+    '''
+    words = tokenize(search_term)
+    if not words:
+        return None, None
+
+    vector = func.to_tsvector(TEXT_SEARCH_CONFIG, Question.question)
+    query = func.to_tsquery(TEXT_SEARCH_CONFIG, ' & '.join(
+        words[:-1] + [f'{words[-1]}:*']))
+
+    return vector.op('@@')(query), func.ts_rank(vector, query)
+
+
+class SearchIndex:
+    '''
+    SearchIndex
+        an in-process inverted index of the words of every question, used
+        for full-text search on databases other than Postgres. It is read
+        from the database on the first search, then kept up to date by `add`
+        and `remove`. Words are matched as they are, without stemming.
+    '''
+
+    def __init__(self):
+        # word -> {question id: occurrences of the word in the question}
+        self._postings = None
+        # The indexed words in order, for prefix lookups
+        self._words = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _index(postings, question_id, text):
+        for word in tokenize(text):
+            occurrences = postings.setdefault(word, {})
+            occurrences[question_id] = occurrences.get(question_id, 0) + 1
+
+    def _get(self):
+        if self._postings is None:
+            postings = {}
+            with reading_from_primary():
+                for question_id, text in db.session.query(Question.id, Question.question):
+                    self._index(postings, question_id, text)
+            self._postings = postings
+            self._words = None
+
+        if self._words is None:
+            self._words = sorted(self._postings)
+
+        return self._postings, self._words
+
+    def _prefix_matches(self, postings, words, prefix):
+        matches = {}
+        position = bisect_left(words, prefix)
+
+        while position < len(words) and words[position].startswith(prefix):
+            for question_id, occurrences in postings[words[position]].items():
+                matches[question_id] = matches.get(
+                    question_id, 0) + occurrences
+            position += 1
+
+        return matches
+
+    def search(self, search_term):
+        '''
+        Returns the (id, score) pairs of the questions containing every word of
+        the search term, the last word matching as a prefix, best score first
+        '''
+        terms = tokenize(search_term)
+        if not terms:
+            return []
+
+        with self._lock:
+            postings, words = self._get()
+            scores = None
+
+            for position, term in enumerate(terms):
+                if position == len(terms) - 1:
+                    matches = self._prefix_matches(postings, words, term)
+                else:
+                    matches = postings.get(term, {})
+
+                if scores is None:
+                    scores = dict(matches)
+                else:
+                    scores = {question_id: score + matches[question_id]
+                              for question_id, score in scores.items() if question_id in matches}
+
+                if not scores:
+                    return []
+
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+    def add(self, question_id, text):
+        with self._lock:
+            # An index that hasn't been built yet will read the question from
+            # the database when it is
+            if self._postings is None:
+                return
+
+            self._index(self._postings, question_id, text)
+            self._words = None
+
+    def remove(self, question_id, text):
+        with self._lock:
+            if self._postings is None:
+                return
+
+            for word in set(tokenize(text)):
+                occurrences = self._postings.get(word)
+                if occurrences is None:
+                    continue
+
+                occurrences.pop(question_id, None)
+                if not occurrences:
+                    del self._postings[word]
+                    self._words = None
+
+    def invalidate(self):
+        with self._lock:
+            self._postings = None
+            self._words = None
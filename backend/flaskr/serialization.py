@@ -0,0 +1,58 @@
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_PROVIDERS = ('auto', 'standard', 'orjson')
+
+
+class CompactJSONProvider(DefaultJSONProvider):
+    '''
+    CompactJSONProvider
+        Flask's JSON provider, writing responses without whitespace and
+        without sorting their keys, also in debug mode
+    '''
+    compact = True
+    sort_keys = False
+
+
+class OrjsonProvider(CompactJSONProvider):
+    '''
+    OrjsonProvider
+        a compact JSON provider serializing with orjson. Calls asking for
+        options of the json module, such as an indent, fall back to it
+    '''
+
+    def dumps(self, obj, **kwargs):
+        if kwargs:
+            return super().dumps(obj, **kwargs)
+
+        return orjson.dumps(obj, default=self.default, option=orjson.OPT_NON_STR_KEYS).decode()
+
+    def loads(self, s, **kwargs):
+        if kwargs:
+            return super().loads(s, **kwargs)
+
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+
+        return self._app.response_class(orjson.dumps(
+            obj, default=self.default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_APPEND_NEWLINE), mimetype=self.mimetype)
+
+
+def get_json_provider_class(name):
+    '''
+    Returns the JSON provider class for one of JSON_PROVIDERS. "auto" picks
+    orjson when it is installed
+    '''
+    if name == 'orjson' or (name == 'auto' and orjson is not None):
+        if orjson is None:
+            raise RuntimeError(
+                'The orjson JSON provider needs orjson to be installed')
+        return OrjsonProvider
+
+    return CompactJSONProvider
@@ -0,0 +1,72 @@
+"""initial schema
+
+Revision ID: 6a1f0c2b9d3e
+Revises: 
+Create Date: 2026-10-18 10:12:41.318204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a1f0c2b9d3e'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+# Databases loaded from trivia.psql, or created by earlier versions of the
+# API, already have some of these, so only what is missing is created
+INDEXES = (
+    'CREATE UNIQUE INDEX IF NOT EXISTS ux_questions_question_lower ON questions (lower(question))',
+    'CREATE UNIQUE INDEX IF NOT EXISTS ux_categories_type_lower ON categories (lower(type))',
+    'CREATE UNIQUE INDEX IF NOT EXISTS ux_users_username_lower ON users (lower(username))',
+    'CREATE INDEX IF NOT EXISTS ix_users_score_id ON users (score DESC, id)',
+)
+POSTGRESQL_INDEXES = (
+    "CREATE INDEX IF NOT EXISTS ix_questions_question_fts ON questions USING GIN (to_tsvector('english', question))",
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    tables = sa.inspect(bind).get_table_names()
+
+    if 'categories' not in tables:
+        op.create_table(
+            'categories',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('type', sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'users' not in tables:
+        op.create_table(
+            'users',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('username', sa.String(), nullable=True),
+            sa.Column('score', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+    if 'questions' not in tables:
+        op.create_table(
+            'questions',
+            sa.Column('id', sa.Integer(), nullable=False),
+            sa.Column('question', sa.String(), nullable=True),
+            sa.Column('answer', sa.String(), nullable=True),
+            sa.Column('category', sa.String(), nullable=True),
+            sa.Column('difficulty', sa.Integer(), nullable=True),
+            sa.Column('rating', sa.Integer(), nullable=True),
+            sa.PrimaryKeyConstraint('id')
+        )
+
+    for statement in INDEXES:
+        op.execute(statement)
+    if bind.dialect.name == 'postgresql':
+        for statement in POSTGRESQL_INDEXES:
+            op.execute(statement)
+
+
+def downgrade():
+    op.drop_table('questions')
+    op.drop_table('users')
+    op.drop_table('categories')
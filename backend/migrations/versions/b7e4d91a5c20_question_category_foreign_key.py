@@ -0,0 +1,69 @@
+"""integer foreign key and indexes for questions.category
+
+Revision ID: b7e4d91a5c20
+Revises: 6a1f0c2b9d3e
+Create Date: 2026-10-18 11:03:57.902451
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7e4d91a5c20'
+down_revision = '6a1f0c2b9d3e'
+branch_labels = None
+depends_on = None
+
+# Rebuilding the table on SQLite drops the indexes on expressions, so they
+# are created again afterwards
+QUESTION_INDEXES = (
+    'CREATE UNIQUE INDEX IF NOT EXISTS ux_questions_question_lower ON questions (lower(question))',
+)
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    category = next(column for column in inspector.get_columns(
+        'questions') if column['name'] == 'category')
+    has_foreign_key = any(foreign_key['referred_table'] == 'categories' and foreign_key['constrained_columns'] == ['category']
+                          for foreign_key in inspector.get_foreign_keys('questions'))
+    has_index = any(index['name'] == 'ix_questions_category_id'
+                    for index in inspector.get_indexes('questions'))
+
+    # Databases loaded from trivia.psql already have an integer column and a
+    # foreign key, those created from the models had a string column
+    with op.batch_alter_table('questions') as batch_op:
+        if not isinstance(category['type'], sa.Integer):
+            batch_op.alter_column('category', existing_type=category['type'], type_=sa.Integer(),
+                                  postgresql_using='category::integer')
+        if not has_foreign_key:
+            batch_op.create_foreign_key('fk_questions_category', 'categories', [
+                                        'category'], ['id'], onupdate='CASCADE', ondelete='SET NULL')
+        if not has_index:
+            batch_op.create_index('ix_questions_category_id', [
+                                  'category', 'id'], unique=False)
+
+    for statement in QUESTION_INDEXES:
+        op.execute(statement)
+
+
+def downgrade():
+    inspector = sa.inspect(op.get_bind())
+    # Only what upgrade creates is dropped: the foreign key of trivia.psql is
+    # named "category" and is kept, and each object is checked as in upgrade
+    has_foreign_key = any(foreign_key['name'] == 'fk_questions_category'
+                          for foreign_key in inspector.get_foreign_keys('questions'))
+    has_index = any(index['name'] == 'ix_questions_category_id'
+                    for index in inspector.get_indexes('questions'))
+
+    # The column is left as an integer, which every version of the API reads
+    with op.batch_alter_table('questions') as batch_op:
+        if has_index:
+            batch_op.drop_index('ix_questions_category_id')
+        if has_foreign_key:
+            batch_op.drop_constraint('fk_questions_category', type_='foreignkey')
+
+    for statement in QUESTION_INDEXES:
+        op.execute(statement)
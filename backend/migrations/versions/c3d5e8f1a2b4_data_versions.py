@@ -0,0 +1,33 @@
+"""data version counter for HTTP caching
+
+Revision ID: c3d5e8f1a2b4
+Revises: b7e4d91a5c20
+Create Date: 2026-10-18 20:02:13.540871
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c3d5e8f1a2b4'
+down_revision = 'b7e4d91a5c20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'data_versions' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    data_versions = op.create_table(
+        'data_versions',
+        sa.Column('id', sa.Integer(), nullable=False),
+        sa.Column('version', sa.Integer(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(data_versions, [{'id': 1, 'version': 1}])
+
+
+def downgrade():
+    op.drop_table('data_versions')
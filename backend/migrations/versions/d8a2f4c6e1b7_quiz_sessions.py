@@ -0,0 +1,38 @@
+"""quiz sessions kept in the database
+
+Revision ID: d8a2f4c6e1b7
+Revises: c3d5e8f1a2b4
+Create Date: 2026-10-18 22:41:05.118204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd8a2f4c6e1b7'
+down_revision = 'c3d5e8f1a2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if 'quiz_sessions' in sa.inspect(op.get_bind()).get_table_names():
+        return
+
+    op.create_table(
+        'quiz_sessions',
+        sa.Column('id', sa.String(), nullable=False),
+        sa.Column('question_ids', sa.LargeBinary(), nullable=False),
+        sa.Column('question_count', sa.Integer(), nullable=False),
+        sa.Column('position', sa.Integer(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_quiz_sessions_expires_at',
+                    'quiz_sessions', ['expires_at'])
+
+
+def downgrade():
+    op.drop_index('ix_quiz_sessions_expires_at', table_name='quiz_sessions')
+    op.drop_table('quiz_sessions')
@@ -7,4 +7,88 @@ DATABASE_NAME = os.environ.get('DATABASE_NAME')
 DATABASE_NAME_2 = os.environ.get('DATABASE_NAME_2')
 DATABASE_PORT = os.environ.get('DATABASE_PORT')
 DATABASE_OWNER = os.environ.get('DATABASE_OWNER')
-DATABASE_PASSWORD = os.environ.get('DATABASE_PASSWORD')
\ No newline at end of file
+DATABASE_PASSWORD = os.environ.get('DATABASE_PASSWORD')
+# Seconds before cached categories are re-read from the database. Leave unset
+# or 0 for a single process; set it when several processes share the database
+CATEGORY_CACHE_TTL = int(os.environ.get('CATEGORY_CACHE_TTL', 0))
+
+# Seconds between checks of the data version by the in-memory quiz question
+# pools, so questions added or deleted by other processes are picked up within
+# that time. 0 checks before every draw
+QUESTION_POOL_CHECK_INTERVAL = float(
+    os.environ.get('QUESTION_POOL_CHECK_INTERVAL', 1))
+
+# Seconds before the in-memory quiz question pools are rebuilt regardless of
+# the data version. Leave unset or 0 to rebuild them only when it changes
+QUESTION_POOL_TTL = int(os.environ.get('QUESTION_POOL_TTL', 0))
+
+# Seconds a server-side quiz session is kept after it was last used
+QUIZ_SESSION_TTL = int(os.environ.get('QUIZ_SESSION_TTL', 3600))
+
+# How questions are searched when the request doesn't say: 'substring' matches
+# the search term anywhere in the question, 'fulltext' matches whole words
+# through a search index and orders the results by relevance
+SEARCH_MODE = os.environ.get('SEARCH_MODE', 'substring')
+
+# Seconds between writes of buffered score increments. Leave unset or 0 to
+# write every increment to the database as it comes in
+SCORE_BUFFER_INTERVAL = float(os.environ.get('SCORE_BUFFER_INTERVAL', 0))
+
+# Seconds the top of the leaderboard is served from memory before it is read
+# again from the database
+LEADERBOARD_CACHE_TTL = int(os.environ.get('LEADERBOARD_CACHE_TTL', 5))
+
+# Connection pool of the database engine. Connections are checked before use
+# and replaced after DATABASE_POOL_RECYCLE seconds, so stale connections left
+# by a database failover are never handed to a request
+DATABASE_POOL_SIZE = int(os.environ.get('DATABASE_POOL_SIZE', 5))
+DATABASE_MAX_OVERFLOW = int(os.environ.get('DATABASE_MAX_OVERFLOW', 10))
+DATABASE_POOL_TIMEOUT = int(os.environ.get('DATABASE_POOL_TIMEOUT', 30))
+DATABASE_POOL_RECYCLE = int(os.environ.get('DATABASE_POOL_RECYCLE', 1800))
+DATABASE_POOL_PRE_PING = os.environ.get(
+    'DATABASE_POOL_PRE_PING', 'true').lower() == 'true'
+# Milliseconds after which Postgres cancels a statement, 0 for no limit
+DATABASE_STATEMENT_TIMEOUT = int(os.environ.get('DATABASE_STATEMENT_TIMEOUT', 0))
+# Set when connecting through PgBouncer, which pools the connections itself
+DATABASE_USE_PGBOUNCER = os.environ.get(
+    'DATABASE_USE_PGBOUNCER', 'false').lower() == 'true'
+
+# What the app does with the schema at startup: "check" compares the schema
+# version recorded by the migrations with the one the code expects, "create"
+# creates the missing tables (for throwaway databases) and "off" does nothing.
+# The schema itself is set up with `flask init-db` or `flask db upgrade`
+SCHEMA_MODE = os.environ.get('SCHEMA_MODE', 'check')
+
+# Comma-separated URLs of read replicas of the database. Read-only endpoints
+# are served by a random replica, everything else by the primary
+DATABASE_REPLICA_URLS = [url.strip() for url in os.environ.get(
+    'DATABASE_REPLICA_URLS', '').split(',') if url.strip()]
+# Seconds during which a client that wrote to the primary keeps reading from
+# it, so it sees its own writes even when the replicas lag behind
+REPLICA_STICKY_SECONDS = int(os.environ.get('REPLICA_STICKY_SECONDS', 5))
+
+# Seconds during which browsers and CDNs may reuse a category or question
+# listing without asking whether it changed. With 0 they revalidate it on
+# every use, which costs a single query when it didn't change
+HTTP_CACHE_MAX_AGE = int(os.environ.get('HTTP_CACHE_MAX_AGE', 0))
+
+# Responses of at least COMPRESSION_MIN_SIZE bytes are compressed with brotli
+# when it is installed and accepted by the client, or with gzip otherwise.
+# Set RESPONSE_COMPRESSION to false when a proxy in front compresses them
+RESPONSE_COMPRESSION = os.environ.get(
+    'RESPONSE_COMPRESSION', 'true').lower() == 'true'
+COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+# The JSON serializer of the responses: "orjson", "standard" for the json
+# module, or "auto" for orjson when it is installed. Both write compact JSON
+JSON_PROVIDER = os.environ.get('JSON_PROVIDER', 'auto')
+
+# Records the SQL statements of each request, reported in a Server-Timing
+# header and a JSON log line with the number of queries, the time spent in
+# them and the slowest one
+SQL_INSTRUMENTATION = os.environ.get(
+    'SQL_INSTRUMENTATION', 'false').lower() == 'true'
+
+# Whether requests, queries and quiz draws are counted for GET /metrics. The
+# metrics are kept by each worker process
+METRICS_ENABLED = os.environ.get(
+    'METRICS_ENABLED', 'true').lower() == 'true'